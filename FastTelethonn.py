@@ -6,8 +6,10 @@ import inspect
 import logging
 import math
 import os
-from collections import defaultdict
-from typing import Optional, List, AsyncGenerator, Union, Awaitable, DefaultDict, Tuple, BinaryIO
+import time
+import weakref
+from collections import defaultdict, deque
+from typing import Optional, List, AsyncGenerator, Union, Awaitable, DefaultDict, Deque, Tuple, BinaryIO, Callable
 
 from telethon import utils, helpers, TelegramClient
 from telethon.crypto import AuthKey
@@ -62,44 +64,79 @@ class DownloadSender:
 class UploadSender:
     client: TelegramClient
     sender: MTProtoSender
-    request: Union[SaveFilePartRequest, SaveBigFilePartRequest]
+    file_id: int
+    big: bool
     part_count: int
-    stride: int
-    previous: Optional[asyncio.Task]
+    in_flight: int
+    pending: Deque[asyncio.Task]
     loop: asyncio.AbstractEventLoop
+    on_part_done: Optional[Callable[[int], None]]
 
     def __init__(self, client: TelegramClient, sender: MTProtoSender, file_id: int, part_count: int, big: bool,
-                 index: int,
-                 stride: int, loop: asyncio.AbstractEventLoop) -> None:
+                 loop: asyncio.AbstractEventLoop,
+                 on_part_done: Optional[Callable[[int], None]] = None,
+                 in_flight: int = 1) -> None:
         self.client = client
         self.sender = sender
+        self.file_id = file_id
+        self.big = big
         self.part_count = part_count
-        if big:
-            self.request = SaveBigFilePartRequest(file_id, index, part_count, b"")
-        else:
-            self.request = SaveFilePartRequest(file_id, index, b"")
-        self.stride = stride
-        self.previous = None
+        # Parts sent on this connection before waiting for the oldest ack;
+        # MTProtoSender packs concurrent requests into one container.
+        self.in_flight = max(1, in_flight)
+        self.pending = deque()
         self.loop = loop
-
-    async def next(self, data: bytes) -> None:
-        if self.previous:
-            await self.previous
-        self.previous = self.loop.create_task(self._next(data))
-
-    async def _next(self, data: bytes) -> None:
-        self.request.bytes = data
-        log.debug(f"Sending file part {self.request.file_part}/{self.part_count}"
-                  f" with {len(data)} bytes")
-        await self.client._call(self.sender, self.request)
-        self.request.file_part += self.stride
+        self.on_part_done = on_part_done
+
+    async def next(self, part: int, data: bytes) -> None:
+        # A failed part stays queued so disconnect() still collects it
+        while len(self.pending) >= self.in_flight:
+            await self.pending[0]
+            self.pending.popleft()
+        self.pending.append(self.loop.create_task(self._next(part, data)))
+
+    async def _next(self, part: int, data: bytes) -> None:
+        if self.big:
+            request = SaveBigFilePartRequest(self.file_id, part, self.part_count, data)
+        else:
+            request = SaveFilePartRequest(self.file_id, part, data)
+        # Lazy %-args: this runs once per part, and the message is only
+        # built when debug logging is actually enabled.
+        log.debug("Sending file part %d/%d with %d bytes", part, self.part_count, len(data))
+        await self.client._call(self.sender, request)
+        if self.on_part_done:
+            self.on_part_done(part)
+
+    async def drain(self) -> MTProtoSender:
+        while self.pending:
+            await self.pending[0]
+            self.pending.popleft()
+        return self.sender
 
     async def disconnect(self) -> None:
-        if self.previous:
-            await self.previous
+        await asyncio.gather(*self.pending, return_exceptions=True)
+        self.pending.clear()
         return await self.sender.disconnect()
 
 
+# Authorized upload connections kept per client and DC between uploads, so the
+# next file skips TCP connect + auth export/import for every sender.
+_idle_senders: "weakref.WeakKeyDictionary[TelegramClient, DefaultDict[int, List[MTProtoSender]]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _sender_pool(client: TelegramClient, dc_id: int) -> List[MTProtoSender]:
+    return _idle_senders.setdefault(client, defaultdict(list))[dc_id]
+
+
+async def close_pooled_senders(client: TelegramClient) -> None:
+    pools = _idle_senders.pop(client, None)
+    if not pools:
+        return
+    await asyncio.gather(*[sender.disconnect() for pool in pools.values() for sender in pool],
+                         return_exceptions=True)
+
+
 class ParallelTransferrer:
     client: TelegramClient
     loop: asyncio.AbstractEventLoop
@@ -107,6 +144,7 @@ class ParallelTransferrer:
     senders: Optional[List[Union[DownloadSender, UploadSender]]]
     auth_key: AuthKey
     upload_ticker: int
+    upload_part: int
 
     def __init__(self, client: TelegramClient, dc_id: Optional[int] = None) -> None:
         self.client = client
@@ -116,6 +154,7 @@ class ParallelTransferrer:
                          else self.client.session.auth_key)
         self.senders = None
         self.upload_ticker = 0
+        self.upload_part = 0
 
     async def _cleanup(self) -> None:
         await asyncio.gather(*[sender.disconnect() for sender in self.senders])
@@ -156,21 +195,33 @@ class ParallelTransferrer:
         return DownloadSender(self.client, await self._create_sender(), file, index * part_size, part_size,
                               stride, part_count)
 
-    async def _init_upload(self, connections: int, file_id: int, part_count: int, big: bool
-                           ) -> None:
+    async def _init_upload(self, connections: int, file_id: int, part_count: int, big: bool,
+                           on_part_done: Optional[Callable[[int], None]] = None,
+                           in_flight: int = 1) -> None:
+        self._upload_sender_args = (file_id, part_count, big, on_part_done, in_flight)
         self.senders = [
-            await self._create_upload_sender(file_id, part_count, big, 0, connections),
+            await self._create_upload_sender(*self._upload_sender_args),
             *await asyncio.gather(
-                *[self._create_upload_sender(file_id, part_count, big, i, connections)
-                  for i in range(1, connections)])
+                *[self._create_upload_sender(*self._upload_sender_args)
+                  for _ in range(1, connections)])
         ]
 
-    async def _create_upload_sender(self, file_id: int, part_count: int, big: bool, index: int,
-                                    stride: int) -> UploadSender:
-        return UploadSender(self.client, await self._create_sender(), file_id, part_count, big, index, stride,
-                            loop=self.loop)
+    async def _create_upload_sender(self, file_id: int, part_count: int, big: bool,
+                                    on_part_done: Optional[Callable[[int], None]] = None,
+                                    in_flight: int = 1) -> UploadSender:
+        return UploadSender(self.client, await self._create_sender(), file_id, part_count, big,
+                            loop=self.loop, on_part_done=on_part_done, in_flight=in_flight)
+
+    async def add_upload_sender(self) -> None:
+        # Parts are numbered centrally in upload(), so a sender can join mid-upload
+        self.senders.append(await self._create_upload_sender(*self._upload_sender_args))
 
     async def _create_sender(self) -> MTProtoSender:
+        pool = _sender_pool(self.client, self.dc_id)
+        while pool:
+            sender = pool.pop()
+            if sender.is_connected():
+                return sender
         dc = await self.client._get_dc(self.dc_id)
         sender = MTProtoSender(self.auth_key, loggers=self.client._log)
         await sender.connect(self.client._connection(dc.ip_address, dc.port, dc.id,
@@ -187,20 +238,39 @@ class ParallelTransferrer:
         return sender
 
     async def init_upload(self, file_id: int, file_size: int, part_size_kb: Optional[float] = None,
-                          connection_count: Optional[int] = None) -> Tuple[int, int, bool]:
+                          connection_count: Optional[int] = None, start_part: int = 0,
+                          on_part_done: Optional[Callable[[int], None]] = None,
+                          parts_in_flight: int = 1) -> Tuple[int, int, bool]:
         connection_count = connection_count or self._get_connection_count(file_size)
         part_size = (part_size_kb or utils.get_appropriated_part_size(file_size)) * 1024
         part_count = (file_size + part_size - 1) // part_size
         is_large = file_size > 10 * 1024 * 1024
-        await self._init_upload(connection_count, file_id, part_count, is_large)
+        if start_part and not is_large:
+            # Small uploads carry an MD5 of the whole file, so they can't skip parts
+            raise ValueError("start_part is only supported for big (>10 MiB) uploads")
+        # Never open more senders than there are parts to hand them
+        connection_count = max(1, min(connection_count, part_count - start_part))
+        self.upload_part = start_part
+        await self._init_upload(connection_count, file_id, part_count, is_large, on_part_done, parts_in_flight)
         return part_size, part_count, is_large
 
     async def upload(self, part: bytes) -> None:
-        await self.senders[self.upload_ticker].next(part)
+        index = self.upload_part
+        self.upload_part += 1
+        await self.senders[self.upload_ticker].next(index, part)
         self.upload_ticker = (self.upload_ticker + 1) % len(self.senders)
 
     async def finish_upload(self) -> None:
-        await self._cleanup()
+        # Wait for in-flight parts, then park the connections for the next upload
+        senders = await asyncio.gather(*[sender.drain() for sender in self.senders])
+        _sender_pool(self.client, self.dc_id).extend(senders)
+        self.senders = None
+
+    async def abort_upload(self) -> None:
+        if self.senders:
+            await asyncio.gather(*[sender.disconnect() for sender in self.senders],
+                                 return_exceptions=True)
+        self.senders = None
 
     async def download(self, file: TypeLocation, file_size: int,
                        part_size_kb: Optional[float] = None,
@@ -223,7 +293,7 @@ class ParallelTransferrer:
                     break
                 yield data
                 part += 1
-                log.debug(f"Part {part} downloaded")
+                log.debug("Part %d downloaded", part)
 
         log.debug("Parallel download finished, cleaning up connections")
         await self._cleanup()
@@ -232,16 +302,108 @@ class ParallelTransferrer:
 parallel_transfer_locks: DefaultDict[int, asyncio.Lock] = defaultdict(lambda: asyncio.Lock())
 
 
-async def stream_file_async(file_to_stream: BinaryIO, chunk_size: int = 1024 * 1024, loop=None):
-    """Async generator that reads from stream without blocking event loop."""
+class ConnectionAutotuner:
+    """Adds upload senders one at a time while each addition still raises throughput.
+
+    The first interval only records a baseline. After that a sender is added
+    per interval until one fails to beat the best rate so far by min_gain,
+    max_connections is reached, or the rate sits at rate_cap_bps (a known
+    upload cap, where more connections can't help).
+    """
+
+    def __init__(self, uploader: ParallelTransferrer, max_connections: int, sent: int,
+                 rate_cap_bps: Optional[float] = None,
+                 interval: float = 2.0, min_gain: float = 1.1) -> None:
+        self.uploader = uploader
+        self.max_connections = max_connections
+        self.rate_cap_bps = rate_cap_bps
+        self.interval = interval
+        self.min_gain = min_gain
+        self.best_rate: Optional[float] = None
+        self.grown = False
+        self.adding: Optional[asyncio.Task] = None
+        self.last_time = time.monotonic()
+        self.last_sent = sent
+        self.done = len(uploader.senders) >= max_connections
+
+    def update(self, sent: int) -> None:
+        if self.done:
+            return
+        now = time.monotonic()
+        if self.adding:
+            # Connecting runs in the background so part dispatch never waits on it
+            if not self.adding.done():
+                return
+            task, self.adding = self.adding, None
+            if task.cancelled() or task.exception():
+                log.debug("Autotune: extra upload connection failed, keeping %d", len(self.uploader.senders))
+                self.done = True
+                return
+            self.grown = True
+            self.done = len(self.uploader.senders) >= self.max_connections
+            # Measure the next interval from when the new sender joined
+            self.last_time, self.last_sent = now, sent
+            return
+        if now - self.last_time < self.interval:
+            return
+        rate = (sent - self.last_sent) / (now - self.last_time)
+        self.last_time, self.last_sent = now, sent
+        if self.rate_cap_bps and rate >= self.rate_cap_bps * 0.9:
+            self.done = True
+        elif self.best_rate is None:
+            self.best_rate = rate
+        elif self.grown and rate < self.best_rate * self.min_gain:
+            self.done = True
+        else:
+            self.best_rate = max(self.best_rate, rate)
+            self.adding = self.uploader.loop.create_task(self.uploader.add_upload_sender())
+        log.debug("Autotune: %.2f MB/s with %d upload connections%s", rate / (1024 * 1024),
+                  len(self.uploader.senders), " (settled)" if self.done else "")
+
+    async def close(self, cancel: bool = False) -> None:
+        # Let a pending connect land in the sender list (so it is pooled or
+        # disconnected with the rest), or cancel it when aborting
+        if self.adding is None:
+            return
+        if cancel:
+            self.adding.cancel()
+        await asyncio.gather(self.adding, return_exceptions=True)
+        self.adding = None
+
+
+def _read_and_hash(file_to_stream: BinaryIO, chunk_size: int, hash_update: Callable[[bytes], None]) -> bytes:
+    data = file_to_stream.read(chunk_size)
+    if data:
+        hash_update(data)
+    return data
+
+
+async def stream_file_async(file_to_stream: BinaryIO, chunk_size: int = 1024 * 1024, loop=None,
+                            hash_update: Optional[Callable[[bytes], None]] = None):
+    """Async generator that reads from stream without blocking event loop.
+
+    The next read is already running in the thread pool while the caller
+    handles the current chunk, so reading overlaps with uploading. If given,
+    `hash_update` is fed each chunk on that same worker thread, in order.
+    """
     loop = loop or asyncio.get_event_loop()
     
-    while True:
-        # Run blocking read in thread pool
-        data_read = await loop.run_in_executor(None, file_to_stream.read, chunk_size)
-        if not data_read:
-            break
-        yield data_read
+    # Run blocking read in thread pool
+    if hash_update:
+        read_args = (_read_and_hash, file_to_stream, chunk_size, hash_update)
+    else:
+        read_args = (file_to_stream.read, chunk_size)
+    pending = loop.run_in_executor(None, *read_args)
+    try:
+        while True:
+            data_read = await pending
+            if not data_read:
+                break
+            pending = loop.run_in_executor(None, *read_args)
+            yield data_read
+    finally:
+        if not pending.done():
+            pending.cancel()
 
 
 
@@ -256,8 +418,17 @@ async def _internal_transfer_to_telegram(
     part_size_kb: float = None,
     connection_count: int = None,
     read_chunk_size: int = 1024 * 1024,
+    file_id: int = None,
+    start_part: int = 0,
+    on_part_done: Callable[[int], None] = None,
+    parts_in_flight: int = 1,
+    max_connection_count: int = None,
+    rate_cap_bps: float = None,
 ) -> Tuple[TypeInputFile, int]:
-    file_id = helpers.generate_random_long()
+    # Resuming: pass the earlier file_id and the first part still missing, with
+    # `response` positioned at start_part * part_size.
+    if file_id is None:
+        file_id = helpers.generate_random_long()
 
     if file_size is None:
         file_size = os.path.getsize(response.name)
@@ -273,36 +444,68 @@ async def _internal_transfer_to_telegram(
         file_size,
         part_size_kb=part_size_kb,
         connection_count=connection_count,
+        start_part=start_part,
+        on_part_done=on_part_done,
+        parts_in_flight=parts_in_flight,
     )
     
-    buffer = bytearray()
-    sent = 0
-    
-    # CHANGED: Use async generator
-    async for data in stream_file_async(response, chunk_size=read_chunk_size, loop=client.loop):
-        sent += len(data)
-        
-        if progress_callback:
-            r = progress_callback(sent, file_size)
-            if inspect.isawaitable(r):
-                await r
-        
-        if not is_large:
-            hash_md5.update(data)
-        
-        if len(buffer) == 0 and len(data) == part_size:
-            await uploader.upload(data)
-            continue
-        
-        buffer.extend(data)
-        while len(buffer) >= part_size:
-            await uploader.upload(bytes(buffer[:part_size]))
-            del buffer[:part_size]
-    
-    if len(buffer) > 0:
-        await uploader.upload(bytes(buffer))
-    
-    await uploader.finish_upload()
+    # Only InputFile (small uploads) carries an MD5; big uploads skip hashing.
+    # Hashing runs in the read worker, off the event loop.
+    md5_update = None if is_large else hash_md5.update
+    try:
+        buffer = bytearray()
+        sent = start_part * part_size
+        autotuner = None
+        if max_connection_count:
+            autotuner = ConnectionAutotuner(uploader, min(max_connection_count, part_count - start_part), sent,
+                                            rate_cap_bps=rate_cap_bps)
+
+        # CHANGED: Use async generator
+        async for data in stream_file_async(response, chunk_size=read_chunk_size, loop=client.loop,
+                                            hash_update=md5_update):
+            sent += len(data)
+
+            if autotuner:
+                autotuner.update(sent)
+
+            if progress_callback:
+                r = progress_callback(sent, file_size)
+                if inspect.isawaitable(r):
+                    await r
+
+            if len(buffer) == 0 and len(data) == part_size:
+                await uploader.upload(data)
+                continue
+
+            # Top up a pending partial part first, then cut whole parts straight
+            # out of `data` so every byte is copied at most once into its part.
+            view = memoryview(data)
+            offset = 0
+            if buffer:
+                offset = min(part_size - len(buffer), len(data))
+                buffer += view[:offset]
+                if len(buffer) < part_size:
+                    continue
+                await uploader.upload(bytes(buffer))
+                buffer.clear()
+            while len(data) - offset >= part_size:
+                await uploader.upload(bytes(view[offset:offset + part_size]))
+                offset += part_size
+            if offset < len(data):
+                buffer += view[offset:]
+
+        if len(buffer) > 0:
+            await uploader.upload(bytes(buffer))
+
+        if autotuner:
+            await autotuner.close()
+        await uploader.finish_upload()
+    except BaseException:
+        if autotuner:
+            await autotuner.close(cancel=True)
+        # Half-used connections may still have parts in flight; don't pool them
+        await uploader.abort_upload()
+        raise
     
     if is_large:
         return InputFileBig(file_id, part_count, file_name), file_size
@@ -319,6 +522,12 @@ async def upload_file(
     part_size_kb: float = None,
     connection_count: int = None,
     read_chunk_size: int = 1024 * 1024,
+    file_id: int = None,
+    start_part: int = 0,
+    on_part_done: Callable[[int], None] = None,
+    parts_in_flight: int = 1,
+    max_connection_count: int = None,
+    rate_cap_bps: float = None,
 ) -> TypeInputFile:
     res, _ = await _internal_transfer_to_telegram(
         client,
@@ -329,6 +538,12 @@ async def upload_file(
         part_size_kb=part_size_kb,
         connection_count=connection_count,
         read_chunk_size=read_chunk_size,
+        file_id=file_id,
+        start_part=start_part,
+        on_part_done=on_part_done,
+        parts_in_flight=parts_in_flight,
+        max_connection_count=max_connection_count,
+        rate_cap_bps=rate_cap_bps,
     )
     return res
 
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
+import hashlib
+import importlib.util
 import io
 import json
 import logging
@@ -8,6 +10,9 @@ import os
 import time
 import random
 import queue
+import socket
+import sys
+import tempfile
 import threading
 from collections import deque
 from datetime import datetime, timezone
@@ -17,19 +22,42 @@ from dotenv import load_dotenv
 
 # Telegram imports
 from telethon import TelegramClient
-from telethon.errors import FloodWaitError, RPCError
+from telethon.errors import (
+    DocumentInvalidError,
+    FileReferenceEmptyError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    FloodWaitError,
+    MediaEmptyError,
+    MediaInvalidError,
+    RPCError,
+)
+from telethon.tl.types import InputDocument
 from telethon.network.connection.tcpabridged import ConnectionTcpAbridged
 
 # Google Drive imports
 import requests
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.auth.transport.requests import AuthorizedSession, Request as GoogleRequest
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from google.oauth2 import service_account
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
 # FastTelethon
-from FastTelethonn import upload_file as fast_upload_file
+from FastTelethonn import close_pooled_senders, upload_file as fast_upload_file
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 load_dotenv()
 
@@ -109,17 +137,52 @@ MAX_SEND_RETRIES = _env_int("MAX_SEND_RETRIES", 8)
 DAILY_SEND_LIMIT = _env_int("DAILY_SEND_LIMIT", 0)
 DAILY_STATE_FILE = (os.getenv("DAILY_STATE_FILE") or "daily_send_state.json").strip()
 
+# Drive file IDs already delivered per target (read and written only with --skip-uploaded)
+UPLOADED_STATE_FILE = (os.getenv("UPLOADED_STATE_FILE") or "uploaded_state.json").strip()
+
+# Optional: remember documents already on Telegram (per account, by Drive
+# md5 + size) so repeats are sent by reference instead of uploaded (empty disables)
+MEDIA_CACHE_FILE = (os.getenv("MEDIA_CACHE_FILE") or "").strip()
+
+# Optional: keep per-file upload progress here so a rerun resumes big uploads
+# instead of starting over (empty disables)
+UPLOAD_RESUME_DIR = (os.getenv("UPLOAD_RESUME_DIR") or "").strip()
+UPLOAD_RESUME_MAX_AGE_HOURS = _env_float("UPLOAD_RESUME_MAX_AGE_HOURS", 6.0)
+
 # Transfer tuning
 TG_UPLOAD_PART_SIZE_KB = _env_int("TG_UPLOAD_PART_SIZE_KB", 512)
+# Telegram requires parts that divide 512 KiB evenly (1, 2, 4, ... 512 KiB);
+# 512 is the ceiling and the fastest, smaller values only add requests.
+TG_VALID_PART_SIZES_KB = frozenset(1 << i for i in range(10))
+if TG_UPLOAD_PART_SIZE_KB not in TG_VALID_PART_SIZES_KB:
+    raise ValueError(
+        f"Invalid TG_UPLOAD_PART_SIZE_KB: {TG_UPLOAD_PART_SIZE_KB!r} "
+        f"(must be one of {sorted(TG_VALID_PART_SIZES_KB)})"
+    )
 TG_UPLOAD_CONNECTIONS = _env_int("TG_UPLOAD_CONNECTIONS", 8)
+# Optional: add connections mid-upload while throughput keeps rising, up to this cap (0 = fixed count)
+TG_UPLOAD_MAX_CONNECTIONS = _env_int("TG_UPLOAD_MAX_CONNECTIONS", 0)
 TG_UPLOAD_READ_CHUNK_KB = _env_int("TG_UPLOAD_READ_CHUNK_KB", 512)
-DRIVE_STREAM_CHUNK_MB = _env_int("DRIVE_STREAM_CHUNK_MB", 64)
+# Parts each upload connection keeps in flight before waiting for an ack (1 = one at a time)
+TG_UPLOAD_INFLIGHT = _env_int("TG_UPLOAD_INFLIGHT", 4)
+# Retries also cover each parallel part upload (FastTelethon uses client._call)
+TG_CONNECTION_RETRIES = _env_int("TG_CONNECTION_RETRIES", 10)
+TG_REQUEST_RETRIES = _env_int("TG_REQUEST_RETRIES", 10)
+# Socket buffers for every MTProto connection (0 keeps the OS default/autotuning)
+TG_SOCKET_SNDBUF_KB = _env_int("TG_SOCKET_SNDBUF_KB", 0)
+TG_SOCKET_RCVBUF_KB = _env_int("TG_SOCKET_RCVBUF_KB", 0)
+DRIVE_STREAM_CHUNK_MB = _env_int("DRIVE_STREAM_CHUNK_MB", 4)
 DRIVE_STREAM_PREFETCH_CHUNKS = _env_int("DRIVE_STREAM_PREFETCH_CHUNKS", 16)
 DRIVE_REQUEST_TIMEOUT_SEC = _env_int("DRIVE_REQUEST_TIMEOUT_SEC", 300)
+# Optional: download each file to this directory first, then upload from disk
+DRIVE_STAGE_DIR = (os.getenv("DRIVE_STAGE_DIR") or "").strip()
 TG_MAX_UPLOAD_MBPS = _env_float("TG_MAX_UPLOAD_MBPS", 15.0)
 TG_PREMIUM_ACCOUNT = _env_bool("TG_PREMIUM_ACCOUNT", False)
 TG_MAX_FILE_GB = _env_float("TG_MAX_FILE_GB", 4.0 if TG_PREMIUM_ACCOUNT else 2.0)
 
+# Event loop: use uvloop when installed (set USE_UVLOOP=false to opt out)
+USE_UVLOOP = _env_bool("USE_UVLOOP", True)
+
 # Logging
 LOG_JSON = _env_bool("LOG_JSON", True)
 LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").strip().upper()
@@ -191,6 +254,204 @@ def check_daily_limit_or_raise():
     state[key] = sent + 1
     _save_daily_state(state)
 
+def refund_daily_send() -> None:
+    # For a send that was counted but never went out (e.g. a stale cached document)
+    if DAILY_SEND_LIMIT <= 0:
+        return
+    state = _load_daily_state()
+    key = _today_key()
+    state[key] = max(0, int(state.get(key, 0)) - 1)
+    _save_daily_state(state)
+
+
+# ---------- Uploaded-file manifest ----------
+# Loaded once per run; membership checks are then plain set lookups.
+_uploaded_state: Optional[Dict[str, List[str]]] = None
+# Cleared when the file on disk can't be parsed, so its history isn't overwritten
+_uploaded_state_writable = True
+
+def _load_uploaded_state() -> Dict[str, List[str]]:
+    global _uploaded_state, _uploaded_state_writable
+    if _uploaded_state is None:
+        _uploaded_state = {}
+        if os.path.exists(UPLOADED_STATE_FILE):
+            try:
+                with open(UPLOADED_STATE_FILE, "r", encoding="utf-8") as f:
+                    _uploaded_state = json.load(f)
+                if not isinstance(_uploaded_state, dict):
+                    raise ValueError("expected a JSON object")
+            except Exception as exc:
+                _uploaded_state = {}
+                _uploaded_state_writable = False
+                log_event("uploaded_state_invalid", level="warning", path=UPLOADED_STATE_FILE, error=str(exc))
+                print(f"[Warning] Can't read {UPLOADED_STATE_FILE} ({exc}); not skipping or recording uploads this run.")
+    return _uploaded_state
+
+def uploaded_file_ids(target_chat) -> set:
+    return set(_load_uploaded_state().get(str(target_chat), []))
+
+def record_uploaded_file(target_chat, file_id: str) -> None:
+    state = _load_uploaded_state()
+    if not _uploaded_state_writable:
+        return
+    ids = state.setdefault(str(target_chat), [])
+    if file_id in ids:
+        return
+    ids.append(file_id)
+    _write_json_atomic(UPLOADED_STATE_FILE, state)
+
+
+def _write_json_atomic(path: str, data) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+# ---------- Sent-media cache ----------
+_media_cache: Optional[Dict[str, Dict[str, Any]]] = None
+_account_id: Optional[int] = None
+
+# Telegram's answer when a cached document can't be used by this account anymore
+STALE_MEDIA_ERRORS = (
+    DocumentInvalidError,
+    FileReferenceEmptyError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    MediaEmptyError,
+    MediaInvalidError,
+)
+
+async def telegram_account_id(client) -> int:
+    global _account_id
+    if _account_id is None:
+        _account_id = (await client.get_me()).id
+    return _account_id
+
+def _media_cache_key(file_meta: Dict[str, Any], account_id: Optional[int]) -> Optional[str]:
+    # access_hash/file_reference are only valid for the account that got them
+    md5 = file_meta.get("md5Checksum")
+    if not MEDIA_CACHE_FILE or not md5 or account_id is None:
+        return None
+    return f"{account_id}:{md5}:{file_meta['size']}"
+
+def _load_media_cache() -> Dict[str, Dict[str, Any]]:
+    global _media_cache
+    if _media_cache is None:
+        _media_cache = {}
+        if os.path.exists(MEDIA_CACHE_FILE):
+            try:
+                with open(MEDIA_CACHE_FILE, "r", encoding="utf-8") as f:
+                    _media_cache = json.load(f)
+            except Exception:
+                _media_cache = {}
+    return _media_cache
+
+def cached_media(file_meta: Dict[str, Any], account_id: Optional[int]) -> Optional[InputDocument]:
+    key = _media_cache_key(file_meta, account_id)
+    entry = _load_media_cache().get(key) if key else None
+    if not entry:
+        return None
+    try:
+        return InputDocument(int(entry["id"]), int(entry["access_hash"]), bytes.fromhex(entry["file_reference"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def remember_media(file_meta: Dict[str, Any], account_id: Optional[int], message) -> None:
+    key = _media_cache_key(file_meta, account_id)
+    document = getattr(getattr(message, "media", None), "document", None)
+    if not key or document is None:
+        return
+    cache = _load_media_cache()
+    cache[key] = {
+        "id": document.id,
+        "access_hash": document.access_hash,
+        "file_reference": document.file_reference.hex(),
+    }
+    _write_json_atomic(MEDIA_CACHE_FILE, cache)
+
+def forget_media(file_meta: Dict[str, Any], account_id: Optional[int]) -> None:
+    key = _media_cache_key(file_meta, account_id)
+    cache = _load_media_cache()
+    if key and cache.pop(key, None) is not None:
+        _write_json_atomic(MEDIA_CACHE_FILE, cache)
+
+
+# ---------- Resumable upload state ----------
+class UploadResumeState:
+    """
+    Remembers the Telegram file_id of a big upload and how many leading parts
+    Telegram has acknowledged. SaveBigFilePart is idempotent per (file_id, part),
+    so a rerun can reuse the file_id and continue from `parts_done`.
+    """
+
+    SAVE_EVERY_PARTS = 64
+
+    def __init__(self, path: str, tg_file_id: int, parts_done: int = 0, created_at: Optional[float] = None):
+        self.path = path
+        self.tg_file_id = tg_file_id
+        # When the first part under this file_id went up; saves keep it as is
+        self.created_at = time.time() if created_at is None else created_at
+        self.parts_done = parts_done
+        self._saved_parts = parts_done
+        # Parallel senders finish out of order; only the contiguous prefix counts
+        self._pending: set = set()
+
+    @classmethod
+    def load(cls, resume_dir: str, file_meta: Dict[str, Any], part_size_kb: int) -> "UploadResumeState":
+        key_src = ":".join(
+            str(v) for v in (file_meta["id"], file_meta["size"], file_meta.get("md5Checksum") or "", part_size_kb)
+        )
+        key = hashlib.sha1(key_src.encode("utf-8")).hexdigest()
+        path = os.path.join(resume_dir, f"{key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Telegram drops unfinished parts after a while, counted from when
+            # they were uploaded, so age is measured from the file_id's creation
+            created_at = float(data["created_at"])
+            if time.time() - created_at <= UPLOAD_RESUME_MAX_AGE_HOURS * 3600:
+                return cls(path, int(data["file_id"]), int(data["parts_done"]), created_at)
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError):
+            log_event("upload_resume_state_invalid", level="warning", path=path)
+        return cls(path, random.getrandbits(63))
+
+    def part_done(self, part: int) -> None:
+        self._pending.add(part)
+        while self.parts_done in self._pending:
+            self._pending.remove(self.parts_done)
+            self.parts_done += 1
+        if self.parts_done - self._saved_parts >= self.SAVE_EVERY_PARTS:
+            self.save()
+
+    def reset(self) -> None:
+        # Every part goes up again, so the held parts are fresh from here on
+        self.created_at = time.time()
+        self.parts_done = 0
+        self._saved_parts = 0
+        self._pending.clear()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        _write_json_atomic(
+            self.path,
+            {
+                "file_id": self.tg_file_id,
+                "parts_done": self.parts_done,
+                "created_at": self.created_at,
+                "saved_at": time.time(),
+            },
+        )
+        self._saved_parts = self.parts_done
+
+    def clear(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
 
 # ---------- Telegram safety helpers ----------
 _last_send_ts = 0.0
@@ -259,6 +520,10 @@ async def send_file_safe(client, target_chat, uploaded_file, caption: str = "",
             print(f"[FloodWait] Sleeping {wait_s + extra:.1f}s...")
             await asyncio.sleep(wait_s + extra)
 
+        except STALE_MEDIA_ERRORS:
+            # A stale cached document won't get better with retries
+            raise
+
         except RPCError as e:
             backoff = min(60, 2 ** attempt)
             extra = random.uniform(1, 5)
@@ -275,6 +540,21 @@ async def send_file_safe(client, target_chat, uploaded_file, caption: str = "",
 
     raise RuntimeError("Failed to send after retries.")
 
+# ---------- Telegram connection tuning ----------
+class TunedConnectionTcpAbridged(ConnectionTcpAbridged):
+    # FastTelethon's parallel senders are built from client._connection, so
+    # they pick these buffers up too.
+    async def _connect(self, *args, **kwargs):
+        await super()._connect(*args, **kwargs)
+        sock = self._writer.get_extra_info("socket")
+        if sock is None:
+            return
+        if TG_SOCKET_SNDBUF_KB > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, TG_SOCKET_SNDBUF_KB * 1024)
+        if TG_SOCKET_RCVBUF_KB > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, TG_SOCKET_RCVBUF_KB * 1024)
+
+
 # ---------- Google Drive Auth ----------
 def build_drive_service_and_creds(creds_path: str = GOOGLE_CREDS_FILE):
     if not os.path.exists(creds_path):
@@ -314,6 +594,26 @@ def build_drive_service_and_creds(creds_path: str = GOOGLE_CREDS_FILE):
     return service, creds
 
 
+def build_drive_session(creds) -> AuthorizedSession:
+    sess = AuthorizedSession(creds)
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=4,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        ),
+    )
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    # Raw reads skip content decoding, so ask Drive not to compress.
+    sess.headers["Accept-Encoding"] = "identity"
+    return sess
+
+
 # ---------- Drive listing helpers ----------
 def list_shared_drives(service, max_results: int = 100) -> List[Dict[str, Any]]:
     resp = service.drives().list(pageSize=max_results, fields="drives(id,name)").execute()
@@ -403,15 +703,16 @@ def list_files_in_folder(
     out = _list_files_with_scope(
         service=service,
         q=q,
-        fields="id,name,size,modifiedTime,mimeType",
+        fields="id,name,size,modifiedTime,mimeType,md5Checksum",
         scope=scope,
         shared_drive_id=shared_drive_id,
         limit=limit,
     )
 
     if extensions:
-        exts = tuple(e.lower() for e in extensions)
-        out = [f for f in out if (f.get("name") or "").lower().endswith(exts)]
+        ext_set = frozenset(e.lower() for e in extensions)
+        splitext = os.path.splitext
+        out = [f for f in out if splitext(f.get("name") or "")[1].lower() in ext_set]
 
     out.sort(key=lambda x: x.get("modifiedTime", ""), reverse=True)
     return out
@@ -429,18 +730,50 @@ def pick_by_number_or_id(prompt: str, items: List[Dict[str, Any]]) -> str:
 
 
 class DrivePrefetchReader(io.RawIOBase):
-    def __init__(self, response: requests.Response, name: str, chunk_mb: int = 64, max_queue_chunks: int = 16):
+    def __init__(self, response: requests.Response, name: str, chunk_mb: int = 4, max_queue_chunks: int = 16):
         self._resp = response
         self.name = name
-        self._q: "queue.Queue[bytes | None]" = queue.Queue(maxsize=max_queue_chunks)
-        self._buf = bytearray()
+        self._q: "queue.Queue[memoryview | None]" = queue.Queue(maxsize=max_queue_chunks)
+        self._chunks: "deque[memoryview]" = deque()
+        self._consumed: List[memoryview] = []
+        self._head_off = 0
+        self._buffered = 0
         self._eof = False
+        # Hashed on the producer thread as chunks arrive; final once EOF is read
+        self._md5 = hashlib.md5()
+        self.bytes_read = 0
+
+        chunk_size = chunk_mb * 1024 * 1024
+        # Recycled chunk buffers. The producer never waits on the pool (a big
+        # read may hold more chunks than it keeps); it allocates when empty,
+        # and the bounded queue is what limits how far it can run ahead.
+        self._pool: "queue.Queue[bytearray]" = queue.Queue()
+        self._pool_keep = max_queue_chunks + 2
 
         def worker():
+            # Fill each chunk in place from the raw stream instead of going
+            # through iter_content's generator and per-read bytes objects.
+            raw = response.raw
             try:
-                for chunk in response.iter_content(chunk_size=chunk_mb * 1024 * 1024):
-                    if chunk:
+                while True:
+                    try:
+                        buf = self._pool.get_nowait()
+                    except queue.Empty:
+                        buf = bytearray(chunk_size)
+                    view = memoryview(buf)
+                    filled = 0
+                    while filled < chunk_size:
+                        n = raw.readinto(view[filled:])
+                        if not n:
+                            break
+                        filled += n
+                    if filled:
+                        chunk = view[:filled]
+                        self._md5.update(chunk)
+                        self.bytes_read += filled
                         self._q.put(chunk)
+                    if filled < chunk_size:
+                        break
             finally:
                 self._q.put(None)
 
@@ -450,24 +783,55 @@ class DrivePrefetchReader(io.RawIOBase):
     def readable(self):
         return True
 
-    def read(self, n=-1):
-        if n == 0:
-            return b""
+    def md5_hexdigest(self) -> str:
+        return self._md5.hexdigest()
 
-        while not self._eof and (n < 0 or len(self._buf) < n):
+    def _fill(self, n: int) -> None:
+        while not self._eof and (n < 0 or self._buffered < n):
             item = self._q.get()
             if item is None:
                 self._eof = True
                 break
-            self._buf.extend(item)
+            self._chunks.append(item)
+            self._buffered += len(item)
+
+    def _take(self, n: int) -> List[memoryview]:
+        # Slice views off the head chunks; nothing is copied until the caller
+        # joins or writes them. Fully consumed chunks wait in _consumed until
+        # that copy is done, then go back to the pool via _recycle().
+        if n < 0 or n > self._buffered:
+            n = self._buffered
+        self._buffered -= n
+        parts: List[memoryview] = []
+        while n:
+            head = self._chunks[0]
+            avail = len(head) - self._head_off
+            if avail <= n:
+                parts.append(head[self._head_off:])
+                self._consumed.append(self._chunks.popleft())
+                self._head_off = 0
+                n -= avail
+            else:
+                parts.append(head[self._head_off:self._head_off + n])
+                self._head_off += n
+                n = 0
+        return parts
+
+    def _recycle(self) -> None:
+        # Keep at most one queue's worth idle; extras from a big read are freed
+        for chunk in self._consumed:
+            if self._pool.qsize() < self._pool_keep:
+                self._pool.put(chunk.obj)
+        self._consumed.clear()
 
-        if n < 0:
-            data = bytes(self._buf)
-            self._buf.clear()
-            return data
+    def read(self, n=-1):
+        if n == 0:
+            return b""
 
-        data = bytes(self._buf[:n])
-        del self._buf[:n]
+        self._fill(n)
+        parts = self._take(n)
+        data = bytes(parts[0]) if len(parts) == 1 else b"".join(parts)
+        self._recycle()
         return data
 
     def close(self):
@@ -508,24 +872,40 @@ class RateLimitedReader(io.RawIOBase):
         finally:
             super().close()
 
-def make_progress_printer(label: str, window_sec: float = 5.0):
-    start = time.time()
-    samples = deque()  # (t, sent_bytes)
+def make_progress_printer(label: str, window_sec: float = 5.0, step_bytes: int = 4 * 1024 * 1024,
+                          start_bytes: int = 0):
+    # start_bytes: already on Telegram before this run (resumed upload); they
+    # count toward the percentage but not toward speed or ETA
+    start = time.monotonic()
+    samples = deque([(start, start_bytes)])  # (t, sent_bytes)
     last_print = 0.0
+    next_check = start_bytes  # byte count at which the clock is consulted again
+    # rewrite one line in place on a terminal; plain lines when piped/logged
+    in_place = sys.stdout.isatty()
+    write, flush = sys.stdout.write, sys.stdout.flush
+    # label is fixed per file, so bake it into the %-template once
+    template = ("\r" if in_place else "") + label.replace("%", "%%") + ": %6.2f%% | %7.2f MB/s"
 
     def cb(sent_bytes: int, total_bytes: int):
-        nonlocal last_print
-        now = time.time()
-
-        # keep samples in a rolling time window
-        samples.append((now, sent_bytes))
-        while samples and (now - samples[0][0]) > window_sec:
-            samples.popleft()
+        nonlocal last_print, next_check
+        # cheapest gate first: an int compare, no clock read, until another
+        # step_bytes have gone through
+        if sent_bytes < next_check and sent_bytes != total_bytes:
+            return
+        now = time.monotonic()
 
-        # print at most once per second
+        # print at most once per second; only sample on print ticks
         if now - last_print < 1.0 and sent_bytes != total_bytes:
             return
         last_print = now
+        next_check = sent_bytes + step_bytes
+
+        # keep samples in a rolling time window, but always one older than
+        # the newest: on slow links ticks are step_bytes apart, which can be
+        # longer than the window itself
+        samples.append((now, sent_bytes))
+        while len(samples) > 2 and (now - samples[1][0]) > window_sec:
+            samples.popleft()
 
         # rolling speed
         if len(samples) >= 2:
@@ -540,14 +920,17 @@ def make_progress_printer(label: str, window_sec: float = 5.0):
 
         # ETA using overall average (stable)
         elapsed = max(now - start, 1e-6)
-        avg_bps = sent_bytes / elapsed
-        eta = ""
+        avg_bps = (sent_bytes - start_bytes) / elapsed
+        line = template % (pct, speed_mb_s)
         if total_bytes and avg_bps > 0:
-            remaining = total_bytes - sent_bytes
-            eta_sec = int(remaining / avg_bps)
-            eta = f" | ETA {eta_sec//60:02d}:{eta_sec%60:02d}"
+            eta_sec = int((total_bytes - sent_bytes) / avg_bps)
+            line += " | ETA %02d:%02d" % divmod(eta_sec, 60)
 
-        print(f"{label}: {pct:6.2f}% | {speed_mb_s:7.2f} MB/s{eta}")
+        if in_place:
+            write(line + ("    \n" if sent_bytes == total_bytes else "    "))
+            flush()
+        else:
+            write(line + "\n")
 
     return cb
 
@@ -575,9 +958,18 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--max-file-gb", type=float, help="Maximum allowed file size in GB for this run.")
     parser.add_argument("--max-upload-mbps", type=float, help="Cap upload throughput in MB/s (default from TG_MAX_UPLOAD_MBPS).")
     parser.add_argument("--upload-connections", type=int, help="Parallel Telegram upload connections (default from TG_UPLOAD_CONNECTIONS).")
+    parser.add_argument(
+        "--stage-dir",
+        help="Download each file to this directory before uploading it (default from DRIVE_STAGE_DIR; empty streams directly).",
+    )
     parser.add_argument("--upload-all", action="store_true", help="Upload all matched files in the selected folder.")
     parser.add_argument("--max-files", type=int, default=0, help="Limit files when --upload-all is used (0 = no limit).")
     parser.add_argument("--continue-on-error", action="store_true", help="Continue next file if one upload fails.")
+    parser.add_argument(
+        "--skip-uploaded",
+        action="store_true",
+        help="Skip files already uploaded to this target and record new ones (in UPLOADED_STATE_FILE).",
+    )
     parser.add_argument("--first-match", action="store_true", help="Auto-pick newest file from filtered list.")
     parser.add_argument(
         "--non-interactive",
@@ -636,12 +1028,19 @@ def _resolve_scope_and_drive(service, args: argparse.Namespace):
     return scope, shared_drive_id
 
 
-def get_downloadable_file_meta(service, file_id: str, max_file_bytes: Optional[int] = None) -> Dict[str, Any]:
-    meta = service.files().get(
+DRIVE_BATCH_MAX_REQUESTS = 100  # Drive batch endpoint limit
+DRIVE_BATCH_RATE_LIMIT_RETRIES = 4
+
+
+def _file_meta_request(service, file_id: str):
+    return service.files().get(
         fileId=file_id,
-        fields="id,name,size,mimeType",
+        fields="id,name,size,mimeType,md5Checksum",
         supportsAllDrives=True,
-    ).execute()
+    )
+
+
+def _check_downloadable_meta(meta: Dict[str, Any], file_id: str, max_file_bytes: Optional[int]) -> Dict[str, Any]:
     filename = meta.get("name") or file_id
     mime_type = meta.get("mimeType") or ""
     if mime_type.startswith("application/vnd.google-apps."):
@@ -662,17 +1061,214 @@ def get_downloadable_file_meta(service, file_id: str, max_file_bytes: Optional[i
         "name": filename,
         "size": size_bytes,
         "mimeType": mime_type,
+        "md5Checksum": meta.get("md5Checksum"),
     }
 
 
+def _is_drive_rate_limit_error(exc) -> bool:
+    if not isinstance(exc, HttpError):
+        return False
+    status = getattr(exc.resp, "status", None)
+    if status == 429:
+        return True
+    # Drive reports per-user/project quota hits as 403 with a rateLimitExceeded reason
+    if status == 403:
+        body = (exc.content or b"").decode("utf-8", "replace")
+        return "rateLimitExceeded" in body or "userRateLimitExceeded" in body
+    return False
+
+
+# One batch round-trip per 100 IDs. Returns one entry per ID, in order:
+# the checked meta dict, or the exception raised for that ID. A failed batch
+# only fails its own IDs; rate-limited IDs are retried with backoff.
+def get_downloadable_file_metas(
+    service,
+    file_ids: List[str],
+    max_file_bytes: Optional[int] = None,
+) -> List[Any]:
+    raw: Dict[str, Any] = {}
+
+    def on_response(request_id, response, exception):
+        raw[request_id] = exception if exception is not None else response
+
+    pending = list(range(len(file_ids)))
+    for attempt in range(DRIVE_BATCH_RATE_LIMIT_RETRIES + 1):
+        if attempt:
+            backoff = min(30, 2 ** attempt) + random.uniform(0, 1)
+            log_event(
+                "drive_batch_rate_limited",
+                level="warning",
+                file_count=len(pending),
+                backoff_seconds=round(backoff, 2),
+                attempt=attempt,
+            )
+            time.sleep(backoff)
+            for i in pending:
+                raw.pop(str(i), None)
+
+        for start in range(0, len(pending), DRIVE_BATCH_MAX_REQUESTS):
+            chunk = pending[start:start + DRIVE_BATCH_MAX_REQUESTS]
+            batch = service.new_batch_http_request(callback=on_response)
+            for i in chunk:
+                batch.add(_file_meta_request(service, file_ids[i]), request_id=str(i))
+            try:
+                batch.execute()
+            except Exception as exc:
+                # Transport/batch-level failure: record it for this batch's IDs only
+                for i in chunk:
+                    raw.setdefault(str(i), exc)
+
+        pending = [i for i in pending if _is_drive_rate_limit_error(raw.get(str(i)))]
+        if not pending:
+            break
+
+    out: List[Any] = []
+    for i, sid in enumerate(file_ids):
+        item = raw.get(str(i))
+        if item is None:
+            item = RuntimeError("No response from Drive batch request.")
+        elif not isinstance(item, Exception):
+            try:
+                item = _check_downloadable_meta(item, sid, max_file_bytes)
+            except Exception as exc:
+                item = exc
+        out.append(item)
+    return out
+
+
+def _drive_media_url(file_id: str) -> str:
+    return f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
+
+
+def _verify_drive_bytes(file_meta: Dict[str, Any], got_bytes: int, got_md5: str, offset: int = 0) -> None:
+    filename = file_meta["name"]
+    file_size = int(file_meta["size"])
+    if offset + got_bytes != file_size:
+        raise RuntimeError(
+            f"Drive stream for '{filename}' ended after {offset + got_bytes} of {file_size} bytes."
+        )
+    # A resumed (ranged) stream only saw the tail, so its MD5 can't be checked
+    expected_md5 = file_meta.get("md5Checksum")
+    if not offset and expected_md5 and got_md5 != expected_md5:
+        raise RuntimeError(
+            f"MD5 mismatch for '{filename}': got {got_md5}, Drive reports {expected_md5}."
+        )
+
+
+class StagedFileReader(io.RawIOBase):
+    # Staged files are read exactly once, front to back: hint sequential access
+    # and drop pages behind the reader, so a multi-GB upload doesn't push the
+    # rest of the host's working set out of the page cache. WILLNEED is left
+    # out on purpose: on a multi-GB file it would try to pull everything in.
+    DROP_BEHIND_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path: str, offset: int = 0):
+        self._f = open(path, "rb", buffering=0)
+        self.name = path
+        self._fd = self._f.fileno()
+        if offset:
+            self._f.seek(offset)
+        self._pos = offset
+        self._dropped = 0
+        self._fadvise = hasattr(os, "posix_fadvise")
+        try:
+            if self._fadvise:
+                os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            elif fcntl is not None and hasattr(fcntl, "F_NOCACHE"):
+                # macOS has no fadvise; F_NOCACHE keeps reads out of the cache
+                fcntl.fcntl(self._fd, fcntl.F_NOCACHE, 1)
+        except OSError:
+            self._fadvise = False
+
+    def readable(self):
+        return True
+
+    def _advance(self, n: int) -> None:
+        self._pos += n
+        if self._fadvise and self._pos - self._dropped >= self.DROP_BEHIND_BYTES:
+            try:
+                os.posix_fadvise(self._fd, self._dropped, self._pos - self._dropped, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                self._fadvise = False
+            self._dropped = self._pos
+
+    def read(self, n=-1):
+        data = self._f.read(n)
+        if data:
+            self._advance(len(data))
+        return data
+
+    def close(self):
+        try:
+            self._f.close()
+        finally:
+            super().close()
+
+
+def download_drive_file_to_stage(
+    drive_session: AuthorizedSession,
+    file_meta: Dict[str, Any],
+    stage_dir: str,
+    progress_label: str = "Downloading",
+    cancel_event: Optional[threading.Event] = None,
+) -> str:
+    # Runs in a worker thread; cancel_event lets the caller stop it between
+    # chunks (the partial file is removed on the way out).
+    file_size = int(file_meta["size"])
+    fd, path = tempfile.mkstemp(prefix="gdrive-", suffix=".part", dir=stage_dir)
+    try:
+        md5 = hashlib.md5()
+        got = 0
+        progress_cb = make_progress_printer(progress_label)
+        # One reused buffer: each chunk is hashed and written before the next read
+        buf = bytearray(DRIVE_STREAM_CHUNK_MB * 1024 * 1024)
+        view = memoryview(buf)
+        with os.fdopen(fd, "wb") as out:
+            with drive_session.get(
+                _drive_media_url(file_meta["id"]),
+                stream=True,
+                timeout=DRIVE_REQUEST_TIMEOUT_SEC,
+            ) as resp:
+                resp.raise_for_status()
+                raw = resp.raw
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RuntimeError(f"Staged download of '{file_meta['name']}' cancelled.")
+                    n = raw.readinto(view)
+                    if not n:
+                        break
+                    md5.update(view[:n])
+                    out.write(view[:n])
+                    got += n
+                    progress_cb(got, file_size)
+        _verify_drive_bytes(file_meta, got, md5.hexdigest())
+        return path
+    except BaseException:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _discard_staged_download(download: "asyncio.Future[str]") -> None:
+    if download.cancelled() or download.exception() is not None:
+        return
+    try:
+        os.unlink(download.result())
+    except FileNotFoundError:
+        pass
+
+
 async def upload_single_drive_file(
     client: TelegramClient,
-    drive_creds,
+    drive_session: AuthorizedSession,
     target_chat,
     file_meta: Dict[str, Any],
     max_upload_mbps: float,
     upload_connections: int,
     progress_label: str = "Uploading",
+    stage_dir: Optional[str] = None,
 ) -> float:
     file_id = file_meta["id"]
     filename = file_meta["name"]
@@ -681,25 +1277,101 @@ async def upload_single_drive_file(
 
     log_event("file_selected", file_id=file_id, file_name=filename, size_bytes=file_size, mime_type=mime_type)
     print(f"\nSelected: {filename} ({file_size/1024/1024:.2f} MB)")
+    is_video = mime_type.startswith("video/")
+
+    account_id = await telegram_account_id(client) if MEDIA_CACHE_FILE else None
+    cached = cached_media(file_meta, account_id)
+    if cached is not None:
+        try:
+            message = await send_file_safe(client, target_chat, cached, caption=filename, as_video=is_video)
+        except STALE_MEDIA_ERRORS as exc:
+            # Document is gone or its reference is no good: upload it again,
+            # and don't count the rejected send against the daily cap
+            refund_daily_send()
+            forget_media(file_meta, account_id)
+            log_event("media_cache_stale", file_id=file_id, file_name=filename, error_type=exc.__class__.__name__)
+        else:
+            remember_media(file_meta, account_id, message)
+            log_event("file_sent_cached", file_id=file_id, file_name=filename, size_bytes=file_size)
+            print("Already on Telegram, sent by reference (nothing uploaded)")
+            return 0.0
+
+    resume = None
+    start_part = 0
+    if UPLOAD_RESUME_DIR and file_size > 10 * 1024 * 1024:
+        resume = UploadResumeState.load(UPLOAD_RESUME_DIR, file_meta, TG_UPLOAD_PART_SIZE_KB)
+        start_part = resume.parts_done
+    part_bytes = TG_UPLOAD_PART_SIZE_KB * 1024
+    if start_part and start_part * part_bytes >= file_size:
+        resume.reset()
+        start_part = 0
 
-    sess = AuthorizedSession(drive_creds)
     stream = None
+    staged_path = None
+    uploaded_ok = False
     try:
-        url = f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media"
-        resp = sess.get(url, stream=True, timeout=DRIVE_REQUEST_TIMEOUT_SEC)
-        resp.raise_for_status()
-
-        base_stream = DrivePrefetchReader(
-            resp,
-            name=filename,
-            chunk_mb=DRIVE_STREAM_CHUNK_MB,
-            max_queue_chunks=DRIVE_STREAM_PREFETCH_CHUNKS,
-        )
+        if stage_dir:
+            # Download leg runs to completion (and is verified) before the
+            # upload starts, so each side runs at its own pace.
+            cancel_download = threading.Event()
+            download = asyncio.get_running_loop().run_in_executor(
+                None,
+                download_drive_file_to_stage,
+                drive_session,
+                file_meta,
+                stage_dir,
+                progress_label.replace("Uploading", "Downloading", 1),
+                cancel_download,
+            )
+            try:
+                # Shielded so the thread's result isn't lost if this task is cancelled
+                staged_path = await asyncio.shield(download)
+            except asyncio.CancelledError:
+                # Stop the worker at its next chunk (so shutdown doesn't wait for the
+                # whole file); if it already finished, remove what it left behind.
+                cancel_download.set()
+                download.add_done_callback(_discard_staged_download)
+                raise
+            log_event("file_staged", file_id=file_id, file_name=filename, path=staged_path)
+            base_stream = StagedFileReader(staged_path, offset=start_part * part_bytes)
+        else:
+            headers = {"Range": f"bytes={start_part * part_bytes}-"} if start_part else None
+            resp = drive_session.get(
+                _drive_media_url(file_id), headers=headers, stream=True, timeout=DRIVE_REQUEST_TIMEOUT_SEC
+            )
+            resp.raise_for_status()
+            if start_part and resp.status_code != 206:
+                # Range ignored: the body starts at byte 0, so upload every part
+                resume.reset()
+                start_part = 0
+
+            base_stream = DrivePrefetchReader(
+                resp,
+                name=filename,
+                chunk_mb=DRIVE_STREAM_CHUNK_MB,
+                max_queue_chunks=DRIVE_STREAM_PREFETCH_CHUNKS,
+            )
         stream = base_stream
         if max_upload_mbps > 0:
             stream = RateLimitedReader(base_stream, max_mbps=max_upload_mbps)
 
-        progress_cb = make_progress_printer(progress_label)
+        if start_part:
+            # Streamed resumes only see the tail, so the Drive MD5 can't be
+            # checked before posting; a staged file was verified in full.
+            content_verified = bool(stage_dir)
+            log_event(
+                "upload_resumed",
+                level="info" if content_verified else "warning",
+                file_id=file_id,
+                file_name=filename,
+                start_part=start_part,
+                content_verified=content_verified,
+            )
+            print(f"Resuming upload at part {start_part} ({start_part * part_bytes/1024/1024:.2f} MB)")
+            if not content_verified:
+                print("[Warning] Resumed stream: only the size is checked, not the MD5.")
+
+        progress_cb = make_progress_printer(progress_label, start_bytes=start_part * part_bytes)
         t0 = time.time()
         uploaded = await fast_upload_file(
             client,
@@ -710,19 +1382,34 @@ async def upload_single_drive_file(
             connection_count=upload_connections,
             read_chunk_size=TG_UPLOAD_READ_CHUNK_KB * 1024,
             progress_callback=progress_cb,
+            file_id=resume.tg_file_id if resume else None,
+            start_part=start_part,
+            on_part_done=resume.part_done if resume else None,
+            parts_in_flight=TG_UPLOAD_INFLIGHT,
+            max_connection_count=TG_UPLOAD_MAX_CONNECTIONS,
+            rate_cap_bps=max_upload_mbps * 1024 * 1024 if max_upload_mbps > 0 else None,
         )
         t1 = time.time()
+        uploaded_ok = True
+
+        # Verify before sending: the parts are uploaded, but nothing is
+        # posted to the chat until the bytes match what Drive reports.
+        # (Staged files were already verified right after download.)
+        if isinstance(base_stream, DrivePrefetchReader):
+            _verify_drive_bytes(
+                file_meta, base_stream.bytes_read, base_stream.md5_hexdigest(), offset=start_part * part_bytes
+            )
 
-        is_video = mime_type.startswith("video/")
-        await send_file_safe(
+        message = await send_file_safe(
             client,
             target_chat,
             uploaded,
             caption=filename,
             as_video=is_video,
         )
+        remember_media(file_meta, account_id, message)
 
-        avg = (file_size / max(t1 - t0, 1e-6)) / (1024 * 1024)
+        avg = ((file_size - start_part * part_bytes) / max(t1 - t0, 1e-6)) / (1024 * 1024)
         log_event(
             "file_uploaded",
             file_id=file_id,
@@ -733,9 +1420,20 @@ async def upload_single_drive_file(
         print(f"\nUpload benchmark avg: {avg:.2f} MB/s")
         return avg
     finally:
+        if resume is not None:
+            # Keep progress only for an interrupted upload; once all parts went
+            # through (sent or rejected), a rerun should start with a fresh file_id.
+            if uploaded_ok:
+                resume.clear()
+            elif resume.parts_done:
+                resume.save()
         if stream is not None:
             stream.close()
-        sess.close()
+        if staged_path:
+            try:
+                os.unlink(staged_path)
+            except FileNotFoundError:
+                pass
 
 
 async def main(args: argparse.Namespace):
@@ -789,10 +1487,15 @@ async def main(args: argparse.Namespace):
     if max_file_gb <= 0:
         raise ValueError("--max-file-gb must be > 0.")
     max_file_bytes = int(max_file_gb * (1024 ** 3))
+    stage_dir = (args.stage_dir or DRIVE_STAGE_DIR or "").strip() or None
+    if stage_dir:
+        os.makedirs(stage_dir, exist_ok=True)
 
     drive_service, drive_creds = build_drive_service_and_creds(GOOGLE_CREDS_FILE)
 
     selected_file_ids: List[str] = []
+    # files.list already returns the fields the precheck needs
+    listed_by_id: Dict[str, Dict[str, Any]] = {}
 
     file_id = (args.file_id or "").strip() or None
     scope = "all"
@@ -844,6 +1547,8 @@ async def main(args: argparse.Namespace):
         if not files:
             raise RuntimeError("No files found in that folder (with your filters).")
 
+        listed_by_id = {f["id"]: f for f in files}
+
         upload_all = args.upload_all
         if not args.non_interactive and not args.upload_all and not args.first_match:
             upload_all = input("\nUpload all files in this folder? (y/N): ").strip().lower() == "y"
@@ -860,6 +1565,7 @@ async def main(args: argparse.Namespace):
                     extensions=exts,
                     limit=5000,
                 )
+                listed_by_id = {f["id"]: f for f in files}
             selected = files
             if args.max_files > 0:
                 selected = selected[:args.max_files]
@@ -883,9 +1589,20 @@ async def main(args: argparse.Namespace):
 
     file_metas = []
     precheck_failures: List[str] = []
+    unlisted_ids = [sid for sid in selected_file_ids if sid not in listed_by_id]
+    fetched = dict(zip(
+        unlisted_ids,
+        get_downloadable_file_metas(drive_service, unlisted_ids, max_file_bytes=max_file_bytes),
+    ))
     for sid in selected_file_ids:
         try:
-            file_metas.append(get_downloadable_file_meta(drive_service, sid, max_file_bytes=max_file_bytes))
+            if sid in listed_by_id:
+                meta = _check_downloadable_meta(listed_by_id[sid], sid, max_file_bytes)
+            else:
+                meta = fetched[sid]
+                if isinstance(meta, Exception):
+                    raise meta
+            file_metas.append(meta)
         except Exception as exc:
             err = f"{sid}: {exc}"
             if args.continue_on_error or len(selected_file_ids) > 1:
@@ -895,18 +1612,36 @@ async def main(args: argparse.Namespace):
                 continue
             raise
 
+    skipped_uploaded = 0
+    if args.skip_uploaded:
+        done_ids = uploaded_file_ids(target_chat)
+        remaining = []
+        for meta in file_metas:
+            if meta["id"] in done_ids:
+                skipped_uploaded += 1
+                log_event("file_already_uploaded", file_id=meta["id"], file_name=meta["name"])
+                print(f"[Skip] Already uploaded: {meta['name']}")
+                continue
+            remaining.append(meta)
+        file_metas = remaining
+
     if not file_metas:
+        if skipped_uploaded:
+            print("All selected files were already uploaded to this target.")
+            return
         raise RuntimeError("No downloadable files left after filtering.")
 
+    # Shared across files so media downloads reuse one keep-alive connection
+    drive_session = build_drive_session(drive_creds)
     client = TelegramClient(
         session_name,
         api_id,
         api_hash,
-        connection=ConnectionTcpAbridged,
-        connection_retries=5,
+        connection=TunedConnectionTcpAbridged,
+        connection_retries=TG_CONNECTION_RETRIES,
         retry_delay=2,
         timeout=20,
-        request_retries=5,
+        request_retries=TG_REQUEST_RETRIES,
         auto_reconnect=True,
     )
 
@@ -935,8 +1670,14 @@ async def main(args: argparse.Namespace):
             "tuning_applied",
             max_upload_mbps=round(max_upload_mbps, 2),
             upload_connections=upload_connections,
+            max_upload_connections=max(TG_UPLOAD_MAX_CONNECTIONS, upload_connections),
+            parts_in_flight=TG_UPLOAD_INFLIGHT,
             max_file_gb=round(max_file_gb, 2),
             premium_mode=bool(args.premium or TG_PREMIUM_ACCOUNT),
+            stage_dir=stage_dir,
+            event_loop=type(asyncio.get_running_loop()).__module__,
+            # Telethon switches MTProto AES-IGE to cryptg's C code when importable
+            cryptg=importlib.util.find_spec("cryptg") is not None,
         )
 
         success_count = 0
@@ -948,13 +1689,16 @@ async def main(args: argparse.Namespace):
                 log_event("upload_begin", file_index=idx, total_files=total_files, file_name=meta["name"])
                 await upload_single_drive_file(
                     client=client,
-                    drive_creds=drive_creds,
+                    drive_session=drive_session,
                     target_chat=target_chat,
                     file_meta=meta,
                     max_upload_mbps=max_upload_mbps,
                     upload_connections=upload_connections,
                     progress_label=prefix,
+                    stage_dir=stage_dir,
                 )
+                if args.skip_uploaded:
+                    record_uploaded_file(target_chat, meta["id"])
                 success_count += 1
             except Exception as exc:
                 err = f"{meta['name']}: {exc}"
@@ -964,6 +1708,8 @@ async def main(args: argparse.Namespace):
                 if not args.continue_on_error:
                     raise
     finally:
+        drive_session.close()
+        await close_pooled_senders(client)
         await client.disconnect()
         log_event("telegram_disconnected")
 
@@ -978,10 +1724,17 @@ async def main(args: argparse.Namespace):
     print("✅ Done.")
 
 
+def run(coro):
+    if uvloop is None or not USE_UVLOOP:
+        return asyncio.run(coro)
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(coro)
+
+
 if __name__ == "__main__":
     cli_args = parse_args()
     try:
-        asyncio.run(main(cli_args))
+        run(main(cli_args))
     except KeyboardInterrupt:
         log_event("run_cancelled", level="warning")
         print("\nCancelled by user.")